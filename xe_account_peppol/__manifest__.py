@@ -18,7 +18,9 @@
     "depends": ["account"],
     "data": [
         'security/security.xml',
+        'data/ir_cron_data.xml',
         'views/account_move_views.xml',
+        'views/peppol_outbound_queue_views.xml',
         'views/res_company_views.xml',
         'views/res_partner_views.xml',
         'views/res_config_settings.xml',
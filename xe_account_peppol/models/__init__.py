@@ -2,3 +2,5 @@ from . import res_partner
 from . import res_company
 from . import account_move
 from . import res_config_settings
+from . import peppol_outbound_queue
+from . import peppol_reconcile_report
@@ -2,8 +2,10 @@ from odoo import fields, models, api, _, tools, Command
 from odoo.exceptions import AccessError, ValidationError
 
 import requests
+import urllib3
 import json
 import logging
+import threading
 
 _logger = logging.getLogger(__name__)
 
@@ -11,6 +13,36 @@ HEADERS = {
     'Content-Type': 'application/json',
 }
 
+PEPPOL_PAGE_SIZE = 100
+PEPPOL_REPORT_SAMPLE_SIZE = 50
+
+# Connect and read timeouts (seconds) of the requests to the middleware
+PEPPOL_REQUEST_TIMEOUT = (10, 60)
+
+# Gateway errors returned before the request reached the access point, safe to queue and replay
+PEPPOL_UNREACHABLE_STATUS_CODES = (502, 503)
+# Gateway timeout, the access point may have processed the request
+PEPPOL_UNKNOWN_OUTCOME_STATUS_CODES = (504,)
+
+# Listing endpoint, local move types and remote UUID key for each document direction
+PEPPOL_RECONCILE_DIRECTIONS = {
+    'sales': ("/api/v1/invoice/sales", ('out_invoice', 'out_refund'), 'sales_invoice_uuid'),
+    'purchase': ("/api/v1/invoice/purchase", ('in_invoice', 'in_refund'), 'purchase_invoice_uuid'),
+}
+
+
+class PeppolUnreachableError(Exception):
+    ''' Raised when the request provably never reached the PEPPOL Access Point, so the operation can be queued '''
+
+
+def _is_peppol_request_not_sent(error):
+    ''' Whether a requests ConnectionError was raised before the request was sent to the server '''
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(reason, urllib3.exceptions.MaxRetryError) and \
+        isinstance(reason.reason, urllib3.exceptions.NewConnectionError)
+
 
 class AccountMove(models.Model):
     _inherit = 'account.move'
@@ -58,6 +90,9 @@ class AccountMove(models.Model):
     is_send_via_peppol = fields.Boolean('Sent via PEPPOL?', copy=False, tracking=True)
     is_enable_peppol = fields.Boolean(string="Enable PEPPOL E-Invoicing", compute="_compute_is_enable_peppol",
                                       copy=False)
+    is_peppol_queued = fields.Boolean(string="Queued for PEPPOL", compute="_compute_is_peppol_queued",
+                                      help="Operations of this invoice are waiting in the PEPPOL outbound queue.")
+    is_peppol_offline = fields.Boolean(string="PEPPOL Offline", related='company_id.account_peppol_edi_offline')
 
     @api.depends('company_id.is_enable_peppol')
     def _compute_is_enable_peppol(self):
@@ -66,6 +101,11 @@ class AccountMove(models.Model):
         else:
             self.is_enable_peppol = False
 
+    def _compute_is_peppol_queued(self):
+        queued = self.env['peppol.outbound.queue'].sudo()._get_blocking_move_ids(self.ids)
+        for move in self:
+            move.is_peppol_queued = move.id in queued
+
     def _get_account_peppol_edi_url(self):
         # PROD_URL = self.env['ir.config_parameter'].sudo().get_param('xe_account_peppol.url') or False
         url = self.env.company.account_peppol_edi_url
@@ -90,8 +130,18 @@ class AccountMove(models.Model):
         :return: Create the invoice/credit note on the PEPPOL and update the PEPPOL Status, Invoice ID & Invoice UUID
         '''
         self._check_field_constrains()
-        url = self._get_account_peppol_edi_url()
         payload = self._get_invoice_payload()
+        self._peppol_submit('create_invoice', endpoint, payload)
+
+    def _peppol_create_invoice(self, endpoint, payload):
+        '''
+        This method is to call the endpoint creating an invoice or a credit note on the PEPPOL Network.
+        :param endpoint: endpoint to call for creating invoice/credit note
+        :param payload: invoice payload built by _get_invoice_payload()
+        :return: Updates the PEPPOL Status, Invoice ID & Invoice UUID
+        :raise: PeppolUnreachableError: If the PEPPOL Access Point cannot be reached
+        '''
+        url = self._get_account_peppol_edi_url()
         try:
             client_number = self.company_id.client_number or self.env.user.company_id.client_number
             HEADERS['x-client-number'] = client_number
@@ -103,6 +153,8 @@ class AccountMove(models.Model):
             if not (200 <= response.status_code <= 299):
                 if json_response.get('message'):
                     raise AccessError(json_response.get('message'))
+        except PeppolUnreachableError:
+            raise
         except Exception as e:
             raise AccessError(e)
         else:
@@ -159,12 +211,11 @@ class AccountMove(models.Model):
         This method is to send the invoice to the PEPPOL Network for processing.
         :return: Sends the invoice to the PEPPOL Network and set the is_send_via_peppol flag true
         '''
-        payload = {"type": "SEND", "invoiceId": int(self.peppol_sales_invoice_id)}
-        invoice_send_response = self.action_update_peppol_invoice_status(payload)
-        if invoice_send_response.status_code == 201:
-            log_message = _(f"Invoice has been sent to the PEPPOL Access Point for processing.")
-            self.is_send_via_peppol = True
-            self._message_log(body=log_message)
+        if self.env['peppol.outbound.queue'].search_count(
+                [('move_id', '=', self.id), ('operation', '=', 'send'), ('state', 'in', ('pending', 'failed'))]):
+            raise ValidationError('This invoice is already queued to be sent via PEPPOL.')
+        payload = {"type": "SEND"}
+        self._peppol_submit('send', False, payload)
 
     def action_create_payment(self, payment_date):
         '''
@@ -173,7 +224,6 @@ class AccountMove(models.Model):
         :return: Updates the payment status of an invoice
         '''
         payload = {
-            "invoiceId": int(self.peppol_sales_invoice_id),
             "payload": {
                 "payment_amount_paid": self.amount_total - self.amount_residual,
                 "payment_date": payment_date.strftime('%Y-%m-%dT%H:%M:%SZ')
@@ -184,7 +234,49 @@ class AccountMove(models.Model):
         else:
             payload["type"] = "MARK_AS_PAID"
 
-        self.action_update_peppol_invoice_status(payload)
+        self._peppol_submit('payment', False, payload)
+
+    def _peppol_submit(self, operation, endpoint, payload):
+        '''
+        This method is to send an outbound operation to the PEPPOL Network, or to store it in the outbound
+        queue when the Access Point is unreachable or earlier operations of this invoice are still queued,
+        so that the operations of an invoice always reach PEPPOL in order.
+        :param operation: operation of peppol.outbound.queue (create_invoice, send, payment)
+        :param endpoint: endpoint of the create_invoice operation
+        :param payload: dict of the fields required to be sent
+        :return: True if the operation was sent, False if it was queued
+        '''
+        queue = self.env['peppol.outbound.queue']
+        if not self.company_id.account_peppol_edi_offline and not queue._get_blocking_move_ids(self.ids):
+            try:
+                self._peppol_execute(operation, endpoint, payload)
+                return True
+            except PeppolUnreachableError as e:
+                self.company_id._peppol_set_offline(e)
+        queue._enqueue(self, operation, endpoint, payload)
+        log_message = _('The operation has been queued and will be sent to the PEPPOL Access Point once it is reachable.')
+        self._message_log(body=log_message)
+        return False
+
+    def _peppol_execute(self, operation, endpoint, payload):
+        '''
+        This method is to execute an outbound operation on the PEPPOL Network.
+        The PEPPOL Invoice ID is resolved here so that operations queued before the invoice was created can be replayed.
+        :param operation: operation of peppol.outbound.queue (create_invoice, send, payment)
+        :param endpoint: endpoint of the create_invoice operation
+        :param payload: dict of the fields required to be sent
+        :raise: PeppolUnreachableError: If the PEPPOL Access Point cannot be reached
+        '''
+        if operation == 'create_invoice':
+            return self._peppol_create_invoice(endpoint, payload)
+        if not self.peppol_sales_invoice_id:
+            raise ValidationError("No PEPPOL Invoice ID Found!")
+        payload = dict(payload, invoiceId=int(self.peppol_sales_invoice_id))
+        response = self.action_update_peppol_invoice_status(payload)
+        if operation == 'send' and response.status_code == 201:
+            log_message = _(f"Invoice has been sent to the PEPPOL Access Point for processing.")
+            self.is_send_via_peppol = True
+            self._message_log(body=log_message)
 
     def action_update_peppol_invoice_status(self, payload):
         '''
@@ -201,6 +293,8 @@ class AccountMove(models.Model):
             print(json_response)
             if not (200 <= response.status_code <= 299):
                 raise AccessError(json_response.get('message'))
+        except PeppolUnreachableError:
+            raise
         except Exception as e:
             raise AccessError(e)
         else:
@@ -209,18 +303,31 @@ class AccountMove(models.Model):
                 self.peppol_sales_invoice_uuid = json_response['sales_invoice_uuid']
         return response
 
-    def _make_request(self, url, payload=None, headers=None, method=None):
-        account_peppol_edi_access_token = self.company_id.account_peppol_edi_access_token or self.env.user.company_id.account_peppol_edi_access_token
+    def _make_request(self, url, payload=None, headers=None, method=None, retry_on_unauthorized=True):
+        # The scheduled jobs run on an empty recordset with the company set through with_company()
+        company = self.company_id or self.env.company
+        account_peppol_edi_access_token = company.account_peppol_edi_access_token
         headers['Authorization'] = f'Bearer {account_peppol_edi_access_token}'
         try:
-            response = requests.request(method, url, headers=headers, data=json.dumps(payload))
+            response = requests.request(method, url, headers=headers, data=json.dumps(payload),
+                                        timeout=PEPPOL_REQUEST_TIMEOUT)
             _logger.info(f'response --------- {url, headers, payload, response}')
+        except requests.exceptions.ConnectionError as e:
+            if _is_peppol_request_not_sent(e):
+                raise PeppolUnreachableError(e)
+            raise AccessError(self._get_peppol_unknown_outcome_message(e))
+        except requests.exceptions.Timeout as e:
+            raise AccessError(self._get_peppol_unknown_outcome_message(e))
         except Exception as e:
             raise AccessError(e)
-        if response.status_code == 401:
-            self.env['res.config.settings'].action_regenerate_tokens(self.env.user.company_id)
+        if response.status_code in PEPPOL_UNREACHABLE_STATUS_CODES:
+            raise PeppolUnreachableError(f'PEPPOL Access Point responded with status {response.status_code}')
+        if response.status_code in PEPPOL_UNKNOWN_OUTCOME_STATUS_CODES:
+            raise AccessError(self._get_peppol_unknown_outcome_message(f'status {response.status_code}'))
+        if response.status_code == 401 and retry_on_unauthorized:
+            self.env['res.config.settings'].action_regenerate_tokens(company)
             print('Token Regenerate----------------------------------------')
-            response = self._make_request(url, payload, headers, method)
+            response = self._make_request(url, payload, headers, method, retry_on_unauthorized=False)
             print('Recursive Request Call----------------------------------')
             return response
         if not (200 <= response.status_code <= 299):
@@ -228,6 +335,11 @@ class AccountMove(models.Model):
             raise AccessError(message)
         return response
 
+    def _get_peppol_unknown_outcome_message(self, error):
+        # The request may have been processed, replaying it could create a duplicate invoice or payment
+        return _("The PEPPOL Access Point did not answer in time (%s). The request may have been processed, "
+                 "please update the PEPPOL status or wait for the reconciliation before trying again.", error)
+
     def _get_invoice_payload(self):
         payload = {
             "sales_invoice_number": self.name,
@@ -271,90 +383,103 @@ class AccountMove(models.Model):
         self._make_creditor_requests(api)
 
     def action_get_creditor(self):
-        ''' This method is to create a creditor on Odoo from the PEPPOL Network '''
-        api = "/api/v1/creditor"
-        self._make_creditor_requests(api)
+        ''' This method is to mirror the creditors of the PEPPOL Network on Odoo '''
+        self.env['res.partner'].action_sync_peppol_creditors()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
 
     def _make_creditor_requests(self, api):
-        all_results = []
-        page, page_size = 0, 49
+        for results in self._iter_peppol_pages(api):
+            self.action_create_vendor_bill(results)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
+
+    def _iter_peppol_pages(self, api, page_size=PEPPOL_PAGE_SIZE):
+        '''
+        This method is to stream a paginated listing of the PEPPOL Network one page at a time.
+        :param api: listing endpoint to call
+        :param page_size: number of records requested per page
+        :return: generator yielding the list of results of each page
+        :raise: AccessError: If any exception occurs
+        '''
+        # The stream ends on an empty page, the middleware may return fewer results than the requested size
         url = self._get_account_peppol_edi_url()
+        client_number = self.env.company.client_number or self.env.user.company_id.client_number
+        page = 0
         while True:
             try:
-                url = f"{url}{api}?client_number={self.company_id.client_number or self.env.user.company_id.client_number}&page={page}&size={page_size}"
-                response = requests.get(url, headers=HEADERS)
-                if response.status_code != 200:
-                    raise AccessError(f"Error occurred: {response.text}")
-                result = response.json().get("results")
-                all_results.extend(result)
-                if len(result) < 10:
-                    break
-                page += 1
+                response = self._make_request(
+                    f"{url}{api}?client_number={client_number}&page={page}&size={page_size}",
+                    payload={}, headers=HEADERS, method="GET"
+                )
+                results = json.loads(response.text).get("results") or []
             except Exception as e:
                 raise AccessError(e)
-        if 'purchase' in api:
-            self.action_create_vendor_bill(all_results)
-        else:
-            self.action_create_creditor(all_results)
-        return {
-            'type': 'ir.actions.client',
-            'tag': 'reload',
-        }
+            if not results:
+                break
+            yield results
+            page += 1
 
     def action_create_vendor_bill(self, all_results):
+        existing_bills = self.env['account.move'].search([
+            ('company_id', '=', self.env.company.id),
+            ('move_type', 'in', PEPPOL_RECONCILE_DIRECTIONS['purchase'][1]),
+            ('peppol_sales_invoice_id', 'in', [str(data['id']) for data in all_results]),
+        ])
+        bills_by_peppol_id = {bill.peppol_sales_invoice_id: bill for bill in existing_bills}
+        missing = []
         for data in all_results:
-            invoice_id = self.env['account.move'].search([('peppol_sales_invoice_id', '=', data['id'])], limit=1)
+            invoice_id = bills_by_peppol_id.get(str(data['id']))
             if invoice_id:
                 invoice_id.account_peppol_edi_status = data['status']
             else:
-                partner_id = self.env['res.partner'].search([('creditor_id', '=', data['creditor_id'])], limit=1)
-                creditor_id = data['creditor_id']
-                if not partner_id and creditor_id != None:
-                    partner_id = self.get_creditor_details(creditor_id)
-                bill_data = {
-                    "name": data['purchase_invoice_number'],
-                    "partner_id": partner_id.id,
-                    "invoice_date": data['purchase_invoice_date'],
-                    "invoice_date_due": data['purchase_invoice_due_date'],
-                    "peppol_sales_invoice_uuid": data['purchase_invoice_uuid'],
-                    "peppol_sales_invoice_id": data['id'],
-                    "account_peppol_edi_status": data['status'],
-                    "move_type": 'in_invoice',
-                    "invoice_line_ids": [
-                        (0, 0, {
-                            "product_id": self.env['product.template'].search([('name', '=', line['service_name'])],
-                                                                              limit=1).id,
-                            "name": line['service_description'],
-                            "quantity": line['service_quantity'] or 0.00,
-                            "price_unit": line['service_price'] or 0.00,
-                        }) for line in data['invoice_lines']
-                    ]
-                }
-                vendor_bill = self.env['account.move'].create(bill_data)
-                return vendor_bill
+                missing.append(data)
+        return self._create_peppol_vendor_bills(missing)
+
+    def _create_peppol_vendor_bills(self, all_results):
+        '''
+        This method is to create the vendor bills of received PEPPOL documents that have no local bill.
+        Creditors and products are resolved with one search per batch and the bills are created at once.
+        :param all_results: received documents returned by the PEPPOL Network
+        :return: the created vendor bills
+        '''
+        if not all_results:
+            return self.env['account.move']
+        creditor_ids = {data['creditor_id'] for data in all_results if data['creditor_id'] is not None}
+        partners = {partner.creditor_id: partner.id for partner in self.env['res.partner'].search(
+            [('creditor_id', 'in', list(creditor_ids))])}
+        for creditor_id in creditor_ids - set(partners):
+            partners[creditor_id] = self.get_creditor_details(creditor_id).id
+        service_names = {line['service_name'] for data in all_results for line in data['invoice_lines']}
+        products = {}
+        for product in self.env['product.product'].search([('name', 'in', list(service_names))]):
+            products.setdefault(product.name, product.id)
+        bills_data = [{
+            "name": data['purchase_invoice_number'],
+            "partner_id": partners.get(data['creditor_id'], False),
+            "invoice_date": data['purchase_invoice_date'],
+            "invoice_date_due": data['purchase_invoice_due_date'],
+            "peppol_sales_invoice_uuid": data['purchase_invoice_uuid'],
+            "peppol_sales_invoice_id": data['id'],
+            "account_peppol_edi_status": data['status'],
+            "move_type": 'in_invoice',
+            "invoice_line_ids": [
+                (0, 0, {
+                    "product_id": products.get(line['service_name'], False),
+                    "name": line['service_description'],
+                    "quantity": line['service_quantity'] or 0.00,
+                    "price_unit": line['service_price'] or 0.00,
+                }) for line in data['invoice_lines']
+            ]
+        } for data in all_results]
+        return self.env['account.move'].create(bills_data)
 
     def action_create_creditor(self, data):
-        partner_uen_check = self.env['res.partner'].search(
-            [('l10n_sg_unique_entity_number', '=', data['legal_entity_trn'])], limit=1)
-        if not partner_uen_check:
-            creditor = {
-                "name": data['name'],
-                "creditor_id": data['id'],
-                "creditor_number": data['creditor_number'],
-                "supplier_rank": 1,
-                "country_id": self.env['res.country'].search([('code', '=', data['country_code'])]).id,
-                "client_id": data['client_id'],
-                "street": data['address'],
-                "zip": data['zip_code'] or '',
-                "city": data['city'] or '',
-                "l10n_sg_unique_entity_number": data['legal_entity_trn'] or '',
-                "state_id": self.env['res.country.state'].search([('name', '=', data['state'])]).id,
-                "email": data['email'] or '',
-            }
-            partner_id = self.env['res.partner'].create(creditor)
-            return partner_id
-        else:
-            return partner_uen_check
+        return self.env['res.partner']._peppol_upsert_creditors([data])[:1]
 
     def get_creditor_details(self, creditor_id):
         url = self._get_account_peppol_edi_url()
@@ -373,6 +498,161 @@ class AccountMove(models.Model):
             create_creditor = self.action_create_creditor(data)
             return create_creditor
 
+    @api.model
+    def _cron_reconcile_peppol_documents(self):
+        ''' Scheduled reconciliation of the PEPPOL documents for every verified company '''
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        companies = self.env['res.company'].search([
+            ('is_enable_peppol', '=', True), ('account_peppol_verification_status', '=', 'verified')])
+        for company in companies:
+            try:
+                self.with_company(company)._reconcile_peppol_documents(auto_commit=auto_commit)
+            except Exception as e:
+                if auto_commit:
+                    self.env.cr.rollback()
+                _logger.exception(f'PEPPOL reconciliation failed for company {company.name}: {e}')
+
+    @api.model
+    def action_reconcile_peppol_documents(self):
+        '''
+        This method is to schedule the reconciliation of the PEPPOL documents right away.
+        The reconciliation runs in the scheduled job, its report is stored in peppol.reconcile.report.
+        :return: Notification that the reconciliation has been scheduled
+        '''
+        self.env.ref('xe_account_peppol.ir_cron_reconcile_peppol_documents').sudo()._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('PEPPOL Reconciliation'),
+                'message': _('The reconciliation has been scheduled, its report will be available in '
+                             'PEPPOL Invoices > Reconciliation Reports.'),
+                'type': 'info',
+            },
+        }
+
+    @api.model
+    def _reconcile_peppol_documents(self, repair=True, auto_commit=False):
+        '''
+        This method is to reconcile the local invoices/bills with the documents on the PEPPOL Access Point.
+        The remote sales and purchase listings are streamed page by page and matched against an in-memory
+        index of the local PEPPOL Invoice ID, UUID & Status, so memory stays bounded by the local index.
+        :param repair: when True, the differences are repaired in bulk, otherwise they are only reported
+        :param auto_commit: when True, the repairs of each page are committed before the next page is fetched
+        :return: the reconciliation report
+        '''
+        report = {
+            'sales': self._reconcile_peppol_direction('sales', repair, auto_commit),
+            'purchase': self._reconcile_peppol_direction('purchase', repair, auto_commit),
+            'missing_upload': self.search_count(self._get_peppol_missing_upload_domain()),
+        }
+        _logger.info(f'PEPPOL reconciliation report --------- {report}')
+        message = _(
+            "Sales: %(sales_status)s status and %(sales_uuid)s UUID differences, %(sales_remote)s remote only, "
+            "%(sales_local)s local only. Purchase: %(purchase_status)s status and %(purchase_uuid)s UUID differences, "
+            "%(purchase_remote)s remote only, %(purchase_local)s local only. %(missing_upload)s posted invoices "
+            "not uploaded to PEPPOL.",
+            sales_status=report['sales']['status_mismatch'], sales_uuid=report['sales']['uuid_mismatch'],
+            sales_remote=report['sales']['remote_only'], sales_local=report['sales']['local_only'],
+            purchase_status=report['purchase']['status_mismatch'], purchase_uuid=report['purchase']['uuid_mismatch'],
+            purchase_remote=report['purchase']['remote_only'], purchase_local=report['purchase']['local_only'],
+            missing_upload=report['missing_upload'],
+        )
+        for direction in ('sales', 'purchase'):
+            if report[direction]['remote_only_sample']:
+                message += _("\n%(direction)s PEPPOL IDs missing locally: %(ids)s.", direction=direction.capitalize(),
+                             ids=', '.join(report[direction]['remote_only_sample']))
+            if report[direction]['local_only_sample']:
+                message += _("\n%(direction)s PEPPOL IDs missing on PEPPOL: %(ids)s.", direction=direction.capitalize(),
+                             ids=', '.join(report[direction]['local_only_sample']))
+        reconcile_report = self.env['peppol.reconcile.report'].create({
+            'company_id': self.env.company.id,
+            'summary': message,
+        })
+        if auto_commit:
+            self.env.cr.commit()
+        return reconcile_report
+
+    def _get_peppol_missing_upload_domain(self):
+        return [
+            ('company_id', '=', self.env.company.id),
+            ('move_type', '=', 'out_invoice'),
+            ('state', '=', 'posted'),
+            ('peppol_sales_invoice_id', '=', False),
+            ('partner_id.peppol_endpoint', '!=', False),
+        ]
+
+    def _get_peppol_local_index(self, move_types):
+        '''
+        This method is to build the in-memory index of the local documents known to PEPPOL.
+        Plain tuples are fetched with SQL to keep the index compact on large move tables.
+        :param move_types: move types of the reconciled direction
+        :return: dict of PEPPOL Invoice ID -> (move id, PEPPOL Invoice UUID, PEPPOL Status)
+        '''
+        self.flush(['company_id', 'move_type', 'peppol_sales_invoice_id', 'peppol_sales_invoice_uuid',
+                    'account_peppol_edi_status'])
+        self.env.cr.execute("""
+            SELECT peppol_sales_invoice_id, id, peppol_sales_invoice_uuid, account_peppol_edi_status
+              FROM account_move
+             WHERE company_id = %s
+               AND move_type IN %s
+               AND peppol_sales_invoice_id IS NOT NULL
+        """, (self.env.company.id, tuple(move_types)))
+        return {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+    def _reconcile_peppol_direction(self, direction, repair, auto_commit=False):
+        '''
+        This method is to reconcile one document direction (sales or purchase) with the PEPPOL Access Point.
+        The differences of each page are repaired in bulk before the next page is fetched.
+        :param direction: key of PEPPOL_RECONCILE_DIRECTIONS
+        :param repair: when True, the differences are repaired in bulk
+        :param auto_commit: when True, the repairs of each page are committed
+        :return: dict with the count and a sample of each kind of difference
+        '''
+        api, move_types, uuid_key = PEPPOL_RECONCILE_DIRECTIONS[direction]
+        local_index = self._get_peppol_local_index(move_types)
+        status_mismatch = uuid_mismatch = remote_only_count = 0
+        remote_only = []
+        for results in self._iter_peppol_pages(api):
+            status_updates = {}
+            uuid_updates = []
+            missing = []
+            for data in results:
+                local = local_index.pop(str(data['id']), None)
+                if not local:
+                    missing.append(data)
+                    continue
+                move_id, local_uuid, local_status = local
+                if data.get('status') and data['status'] != local_status:
+                    status_updates.setdefault(data['status'], []).append(move_id)
+                if data.get(uuid_key) and data[uuid_key] != local_uuid:
+                    uuid_updates.append((move_id, data[uuid_key]))
+            status_mismatch += sum(len(move_ids) for move_ids in status_updates.values())
+            uuid_mismatch += len(uuid_updates)
+            remote_only_count += len(missing)
+            remote_only.extend(str(data['id']) for data in missing[:PEPPOL_REPORT_SAMPLE_SIZE - len(remote_only)])
+            if not repair:
+                continue
+            for status, move_ids in status_updates.items():
+                self.browse(move_ids).write({'account_peppol_edi_status': status})
+            for move_id, uuid in uuid_updates:
+                self.browse(move_id).peppol_sales_invoice_uuid = uuid
+            # Received documents without a local bill are created page by page to keep memory bounded
+            if missing and direction == 'purchase':
+                self._create_peppol_vendor_bills(missing)
+            self.flush()
+            self.invalidate_cache()
+            if auto_commit:
+                self.env.cr.commit()
+
+        return {
+            'status_mismatch': status_mismatch,
+            'uuid_mismatch': uuid_mismatch,
+            'remote_only': remote_only_count,
+            'remote_only_sample': remote_only,
+            'local_only': len(local_index),
+            'local_only_sample': list(local_index)[:PEPPOL_REPORT_SAMPLE_SIZE],
+        }
 
 class AccountPaymentRegister(models.TransientModel):
     _inherit = 'account.payment.register'
@@ -381,9 +661,12 @@ class AccountPaymentRegister(models.TransientModel):
         result = super(AccountPaymentRegister, self)._create_payments()
         moves = self.env['account.move'].browse(self.env.context.get('active_ids'))
         payment_date = result.date
+        queued_move_ids = self.env['peppol.outbound.queue']._get_blocking_move_ids(moves.ids)
         for move in moves:
-            if move.peppol_sales_invoice_id:
-                if move.account_peppol_edi_status not in ('unpaid', 'partially_paid'):
+            if move.peppol_sales_invoice_id or move.id in queued_move_ids:
+                # The PEPPOL status cannot be refreshed while the Access Point is unreachable, the payment is queued
+                is_deferred = move.company_id.account_peppol_edi_offline or move.id in queued_move_ids
+                if not is_deferred and move.account_peppol_edi_status not in ('unpaid', 'partially_paid'):
                     raise ValidationError(
                         f'Sorry, you can not make the payment for "{move.display_name}" as PEPPOL status is not up to date. Please update the PEPPOL status.')
                 else:
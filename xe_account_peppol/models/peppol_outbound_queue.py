@@ -0,0 +1,162 @@
+from odoo import fields, models, api, _
+from odoo.exceptions import ValidationError
+
+from .account_move import PeppolUnreachableError
+
+import json
+import logging
+import psycopg2
+import threading
+
+_logger = logging.getLogger(__name__)
+
+PEPPOL_QUEUE_BATCH_SIZE = 100
+
+
+class PeppolOutboundQueue(models.Model):
+    _name = 'peppol.outbound.queue'
+    _description = 'PEPPOL Outbound Queue'
+    _order = 'id'
+
+    move_id = fields.Many2one('account.move', string='Invoice', required=True, ondelete='cascade', index=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, index=True)
+    operation = fields.Selection([
+        ('create_invoice', 'Create Invoice'),
+        ('send', 'Send'),
+        ('payment', 'Payment'),
+    ], string='Operation', required=True)
+    endpoint = fields.Char(string='Endpoint')
+    payload = fields.Text(string='Payload', required=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ], string='Status', default='pending', required=True, index=True)
+    error = fields.Text(string='Error', readonly=True)
+    date_done = fields.Datetime(string='Sent On', readonly=True)
+
+    def _enqueue(self, move, operation, endpoint, payload):
+        '''
+        This method is to store an outbound operation of an invoice until the PEPPOL Access Point is reachable.
+        :param move: invoice/credit note the operation belongs to
+        :param operation: operation to replay (create_invoice, send, payment)
+        :param endpoint: endpoint of the create_invoice operation
+        :param payload: dict of the fields required to be sent
+        :return: the queued operation
+        '''
+        return self.create({
+            'move_id': move.id,
+            'company_id': move.company_id.id,
+            'operation': operation,
+            'endpoint': endpoint,
+            'payload': json.dumps(payload),
+        })
+
+    @api.model
+    def _get_blocking_move_ids(self, move_ids):
+        '''
+        This method is to find the invoices whose new operations must be queued behind earlier ones.
+        Failed operations block the invoice as well, so that its operations are never sent out of order.
+        :param move_ids: ids of the invoices to check
+        :return: set of invoice ids having pending or failed operations
+        '''
+        if not move_ids:
+            return set()
+        groups = self.read_group(
+            [('move_id', 'in', move_ids), ('state', 'in', ('pending', 'failed'))], ['move_id'], ['move_id'])
+        return {group['move_id'][0] for group in groups}
+
+    def action_retry(self):
+        ''' This method is to put failed operations back in the queue '''
+        self.filtered(lambda op: op.state == 'failed').write({'state': 'pending', 'error': False})
+
+    def action_cancel(self):
+        ''' This method is to drop operations that must not be sent to PEPPOL anymore '''
+        if self.filtered(lambda op: op.state == 'done'):
+            raise ValidationError('Sorry, you can not cancel an operation that has already been sent to PEPPOL.')
+        self.write({'state': 'cancelled'})
+
+    @api.model
+    def action_replay(self):
+        ''' This method is to schedule the replay of the outbound queue right away '''
+        self.env.ref('xe_account_peppol.ir_cron_replay_peppol_outbound_queue').sudo()._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('PEPPOL Outbound Queue'),
+                'message': _('The replay of the outbound queue has been scheduled.'),
+                'type': 'info',
+            },
+        }
+
+    @api.model
+    def _cron_replay_outbound_queue(self):
+        ''' Scheduled replay of the outbound queue for every company in the PEPPOL offline mode '''
+        companies = self.env['res.company'].search([('account_peppol_edi_offline', '=', True)])
+        groups = self.read_group([('state', '=', 'pending')], ['company_id'], ['company_id'])
+        companies |= self.env['res.company'].browse([group['company_id'][0] for group in groups])
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        for company in companies:
+            try:
+                self._replay_company(company)
+            except Exception as e:
+                if auto_commit:
+                    self.env.cr.rollback()
+                _logger.exception(f'PEPPOL outbound queue replay failed for company {company.name}: {e}')
+
+    @api.model
+    def _replay_company(self, company, batch_size=PEPPOL_QUEUE_BATCH_SIZE):
+        '''
+        This method is to replay the pending operations of a company in order. Each operation is committed
+        on its own, as its request to PEPPOL can not be rolled back. The replay stops at the first unreachable error; an operation failing for any other reason blocks
+        the remaining operations of its invoice only. Database errors are transient and abort the replay
+        without marking the operation as failed, it is retried on the next run.
+        :param company: company whose queue is replayed
+        :param batch_size: number of operations processed per batch
+        '''
+        queue = self.with_company(company)
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        blocked_move_ids = set(queue.search([('company_id', '=', company.id), ('state', '=', 'failed')]).move_id.ids)
+        while True:
+            operations = queue.search([
+                ('company_id', '=', company.id),
+                ('state', '=', 'pending'),
+                ('move_id', 'not in', list(blocked_move_ids)),
+            ], limit=batch_size)
+            if not operations:
+                company._peppol_set_online()
+                break
+            try:
+                operations._replay(blocked_move_ids, auto_commit)
+            except PeppolUnreachableError as e:
+                company._peppol_set_offline(e)
+                if auto_commit:
+                    self.env.cr.commit()
+                break
+
+    def _replay(self, blocked_move_ids, auto_commit=False):
+        '''
+        This method is to execute a batch of queued operations on the PEPPOL Network.
+        :param blocked_move_ids: ids of the invoices with a failed operation, updated in place
+        :param auto_commit: when True, each operation is committed as soon as it has been sent
+        :raise: PeppolUnreachableError: If the PEPPOL Access Point cannot be reached
+        '''
+        for operation in self:
+            if operation.move_id.id in blocked_move_ids:
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    operation.move_id._peppol_execute(
+                        operation.operation, operation.endpoint, json.loads(operation.payload))
+            except (PeppolUnreachableError, psycopg2.OperationalError):
+                raise
+            except Exception as e:
+                _logger.warning(f'PEPPOL queued operation {operation.id} failed: {e}')
+                blocked_move_ids.add(operation.move_id.id)
+                operation.write({'state': 'failed', 'error': str(e)})
+            else:
+                operation.write({'state': 'done', 'date_done': fields.Datetime.now()})
+            if auto_commit:
+                self.env.cr.commit()
@@ -0,0 +1,10 @@
+from odoo import fields, models
+
+
+class PeppolReconcileReport(models.Model):
+    _name = 'peppol.reconcile.report'
+    _description = 'PEPPOL Reconciliation Report'
+    _order = 'id desc'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, index=True, readonly=True)
+    summary = fields.Text(string='Summary', readonly=True)
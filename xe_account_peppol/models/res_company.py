@@ -27,11 +27,36 @@ class Company(models.Model):
     account_peppol_edi_url = fields.Char(string='PEPPOL URL')
     account_peppol_edi_access_token = fields.Char(string='PEPPOL Access Token')
     account_peppol_edi_refresh_token = fields.Char(string='PEPPOL Refresh Token')
+    account_peppol_edi_offline = fields.Boolean(string='PEPPOL Offline', copy=False,
+                                                help="The PEPPOL Access Point is unreachable, outbound operations are queued.")
+    account_peppol_edi_offline_since = fields.Datetime(string='PEPPOL Offline Since', copy=False)
+    account_peppol_creditor_sync_date = fields.Datetime(string='PEPPOL Creditors Synced On', copy=False)
 
     def get_is_peppol_enabled(self):
         company = self.env.company
         return company.is_enable_peppol and company.account_peppol_verification_status == 'verified'
 
+    def _peppol_set_offline(self, reason=None):
+        '''
+        This method is to switch the company to the PEPPOL offline mode, outbound operations are then queued.
+        :param reason: error raised while reaching the Access Point
+        '''
+        for company in self.filtered(lambda c: not c.account_peppol_edi_offline):
+            _logger.warning(f'PEPPOL Access Point unreachable for company {company.name}: {reason}')
+            company.sudo().write({
+                'account_peppol_edi_offline': True,
+                'account_peppol_edi_offline_since': fields.Datetime.now(),
+            })
+
+    def _peppol_set_online(self):
+        ''' This method is to leave the PEPPOL offline mode once the outbound queue has been replayed '''
+        for company in self.filtered('account_peppol_edi_offline'):
+            _logger.info(f'PEPPOL Access Point reachable again for company {company.name}')
+            company.sudo().write({
+                'account_peppol_edi_offline': False,
+                'account_peppol_edi_offline_since': False,
+            })
+
     def _make_request(self, url, payload=None, headers=None, method=None):
         try:
             response = requests.request(method, url, headers=headers, data=json.dumps(payload))
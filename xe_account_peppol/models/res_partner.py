@@ -1,9 +1,13 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError, AccessError
+from dateutil import parser
+from datetime import timezone
 
+import psycopg2
 import requests
 import json
 import logging
+import re
 
 _logger = logging.getLogger(__name__)
 
@@ -11,19 +15,42 @@ HEADERS = {
     'Content-Type': 'application/json',
 }
 
+# Singapore UEN formats: businesses (nnnnnnnnX), local companies (yyyynnnnnX) and other entities (TyyPQnnnnX)
+UEN_PATTERN = re.compile(r'^(\d{8}[A-Z]|\d{9}[A-Z]|[TSR]\d{2}[A-Z][A-Z0-9]\d{4}[A-Z])$')
+
 
 class Partner(models.Model):
     _inherit = "res.partner"
 
     debtor_id = fields.Integer(string="Debtor ID", store=True, readonly=True, tracking=True)
     debtor_number = fields.Char(string="Debtor No.", store=True, readonly=True, tracking=True)
-    creditor_id = fields.Integer(string="Creditor ID", store=True, tracking=True)
+    creditor_id = fields.Integer(string="Creditor ID", store=True, tracking=True, index=True)
     creditor_number = fields.Char(string="Creditor Number.", store=True, readonly=True, tracking=True)
     client_id = fields.Integer(string="Client ID", store=True, readonly=True, tracking=True)
     peppol_endpoint = fields.Char(
         string="PEPPOL ID",
         help="Unique identifier used by the BIS Billing 3.0 and its derivatives, also known as 'Endpoint ID'.",
         store=True, readonly=True, tracking=True)
+    l10n_sg_unique_entity_number = fields.Char(string='UEN', index=True)
+
+    def init(self):
+        '''
+        This method is to create the trigram indexes used by the partner autocomplete.
+        The pg_trgm extension is optional, without it the name search falls back to sequential scans.
+        '''
+        super().init()
+        cr = self.env.cr
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except psycopg2.Error:
+            _logger.warning('PEPPOL: pg_trgm extension is not available, partner name search will not be trigram indexed.')
+            return
+        cr.execute("CREATE INDEX IF NOT EXISTS res_partner_name_trgm_idx ON res_partner USING gin (name gin_trgm_ops)")
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS res_partner_l10n_sg_unique_entity_number_trgm_idx
+                ON res_partner USING gin (l10n_sg_unique_entity_number gin_trgm_ops)
+        """)
 
     def _get_account_peppol_edi_url(self):
         url = self.env.company.account_peppol_edi_url
@@ -34,12 +61,22 @@ class Partner(models.Model):
     @api.model
     def _name_search(self, name='', args=None, operator='ilike', limit=100, name_get_uid=None):
         args = list(args or [])
+        uen = (name or '').strip().upper()
+        if operator in ('ilike', '=ilike', '=') and UEN_PATTERN.match(uen):
+            # UEN-shaped input is an exact, indexed lookup; fall back to the general search on no match
+            partner_ids = self._search(args + [('l10n_sg_unique_entity_number', '=', uen)], limit=limit,
+                                       access_rights_uid=name_get_uid)
+            if partner_ids:
+                return partner_ids
         if name:
             args += ['|', ('name', operator, name), ('l10n_sg_unique_entity_number', operator, name)]
         return self._search(args, limit=limit, access_rights_uid=name_get_uid)
 
     @api.constrains("l10n_sg_unique_entity_number")
     def _check_unique_l10n_sg_unique_entity_number(self):
+        # The creditor sync checks the UEN No. of a whole batch up front, see _peppol_upsert_creditors()
+        if self.env.context.get('peppol_creditor_uen_checked'):
+            return
         for rec in self:
             if rec.l10n_sg_unique_entity_number:
                 msg = "UEN No. '%s' already exists in the system!" % rec.l10n_sg_unique_entity_number
@@ -107,6 +144,161 @@ class Partner(models.Model):
         log_message = _('The debtor has been created on PEPPOL.')
         self._message_log(body=log_message)
 
+    @api.model
+    def action_sync_peppol_creditors(self):
+        '''
+        This method is to mirror the creditor directory of the PEPPOL Network into the partners.
+        The directory is streamed page by page and each page is upserted in batch. The creditor listing
+        cannot be filtered on a modification date, so every run downloads the whole directory; creditors
+        not updated since the previous sync are only skipped locally, without any write.
+        :return: Updates the creditor partners and the last creditor sync date of the company
+        '''
+        company = self.env.company
+        sync_date = fields.Datetime.now()
+        countries, states = self._get_peppol_creditor_maps()
+        for creditors in self.env['account.move']._iter_peppol_pages("/api/v1/creditor"):
+            self._peppol_upsert_creditors(creditors, countries, states, since=company.account_peppol_creditor_sync_date)
+            self.flush()
+            self.invalidate_cache()
+        company.sudo().account_peppol_creditor_sync_date = sync_date
+
+    @api.model
+    def _cron_sync_peppol_creditors(self):
+        ''' Scheduled sync of the PEPPOL creditor directory for every verified company '''
+        companies = self.env['res.company'].search([
+            ('is_enable_peppol', '=', True), ('account_peppol_verification_status', '=', 'verified')])
+        for company in companies:
+            try:
+                self.with_company(company).action_sync_peppol_creditors()
+            except Exception as e:
+                _logger.exception(f'PEPPOL creditor sync failed for company {company.name}: {e}')
+
+    @api.model
+    def _get_peppol_creditor_maps(self):
+        '''
+        This method is to preload the countries and states used to resolve the creditor addresses.
+        :return: dict of country code -> country id, dict of (country id, state name) and state name -> state id
+        '''
+        countries = {country['code']: country['id'] for country in self.env['res.country'].search_read([], ['code'])}
+        states = {}
+        for state in self.env['res.country.state'].search_read([], ['name', 'country_id']):
+            states[(state['country_id'][0], state['name'])] = state['id']
+            states.setdefault(state['name'], state['id'])
+        return countries, states
+
+    @api.model
+    def _prepare_peppol_creditor_vals(self, data, countries, states):
+        country_id = countries.get(data.get('country_code'), False)
+        return {
+            "name": data['name'],
+            "creditor_id": data['id'],
+            "creditor_number": data['creditor_number'],
+            "country_id": country_id,
+            "client_id": data['client_id'],
+            "street": data['address'],
+            "zip": data['zip_code'] or '',
+            "city": data['city'] or '',
+            "l10n_sg_unique_entity_number": data['legal_entity_trn'] or '',
+            "state_id": states.get((country_id, data.get('state')), states.get(data.get('state'), False)),
+            "email": data['email'] or '',
+        }
+
+    @api.model
+    def _get_peppol_utc_datetime(self, value):
+        date = parser.isoparse(value)
+        if date.tzinfo:
+            date = date.astimezone(timezone.utc).replace(tzinfo=None)
+        return date
+
+    @api.model
+    def _get_peppol_creditor_value(self, partner, field_name):
+        value = partner[field_name]
+        if isinstance(value, models.BaseModel):
+            return value.id
+        return value or False
+
+    @api.model
+    def _log_peppol_creditor_conflict(self, data, owner):
+        _logger.warning(f"PEPPOL creditor {data['id']} skipped: UEN No. {data['legal_entity_trn']} "
+                        f"already belongs to {owner}")
+
+    @api.model
+    def _peppol_upsert_creditors(self, creditors, countries=None, states=None, since=None):
+        '''
+        This method is to create or update the partners of a batch of PEPPOL creditors.
+        Partners are matched on the Creditor ID, then on the UEN No. A partner matched on the UEN No. only
+        is linked to the creditor without overwriting its details. When several creditors share a UEN No.,
+        the first one linked to the partner keeps it and the others are logged and skipped, within a batch
+        as well as across pages and runs. A creditor whose UEN No. is held by another partner is skipped the
+        same way; as the UEN No. of the whole batch are checked here, the per-partner unique UEN No.
+        constraint is bypassed for the batch write and create.
+        :param creditors: list of creditors returned by the PEPPOL Network
+        :param countries: preloaded countries, see _get_peppol_creditor_maps()
+        :param states: preloaded states, see _get_peppol_creditor_maps()
+        :param since: last sync date, known creditors not updated since then are skipped
+        :return: partners of the creditors
+        '''
+        if countries is None or states is None:
+            countries, states = self._get_peppol_creditor_maps()
+        partner_obj = self.with_context(active_test=False)
+        creditor_ids = [data['id'] for data in creditors]
+        uens = [data['legal_entity_trn'] for data in creditors if data.get('legal_entity_trn')]
+        by_creditor = {partner.creditor_id: partner for partner in partner_obj.search([('creditor_id', 'in', creditor_ids)])}
+        by_uen = {partner.l10n_sg_unique_entity_number: partner
+                  for partner in partner_obj.search([('l10n_sg_unique_entity_number', 'in', uens)])} if uens else {}
+
+        partners = self.env['res.partner']
+        updates = {}
+        to_create = {}
+        # UEN No. -> id of the partner holding it, False for a partner created by this batch
+        uen_owners = {uen: partner.id for uen, partner in by_uen.items()}
+        # partner id -> creditor id linked to it by this batch
+        claimed = {}
+        for data in creditors:
+            partner = by_creditor.get(data['id'])
+            vals = self._prepare_peppol_creditor_vals(data, countries, states)
+            uen = vals['l10n_sg_unique_entity_number']
+            if partner:
+                if since and data.get('updated_at') and self._get_peppol_utc_datetime(data['updated_at']) <= since:
+                    partners |= partner
+                    continue
+                if uen and uen_owners.get(uen, partner.id) != partner.id:
+                    self._log_peppol_creditor_conflict(data, f'partner {uen_owners[uen] or "created by this sync"}')
+                    partners |= partner
+                    continue
+                if uen:
+                    uen_owners[uen] = partner.id
+            else:
+                partner = by_uen.get(uen)
+                if partner:
+                    owner = claimed.get(partner.id) or partner.creditor_id
+                    if owner and owner != data['id']:
+                        self._log_peppol_creditor_conflict(data, f'creditor {owner}')
+                        partners |= partner
+                        continue
+                    claimed[partner.id] = data['id']
+                    vals = {key: vals[key] for key in ('creditor_id', 'creditor_number')}
+                elif uen and uen in uen_owners:
+                    self._log_peppol_creditor_conflict(data, f'partner {uen_owners[uen] or "created by this sync"}')
+                    continue
+            if partner:
+                partners |= partner
+                changes = {key: value for key, value in vals.items()
+                           if self._get_peppol_creditor_value(partner, key) != (value or False)}
+                if changes:
+                    updates.setdefault(tuple(sorted(changes.items())), []).append(partner.id)
+            else:
+                to_create.setdefault(uen or data['id'], dict(vals, supplier_rank=1))
+                if uen:
+                    uen_owners[uen] = False
+
+        partner_obj = self.with_context(peppol_creditor_uen_checked=True)
+        for changes, partner_ids in updates.items():
+            partner_obj.browse(partner_ids).write(dict(changes))
+        if to_create:
+            partners |= partner_obj.with_context(tracking_disable=True).create(list(to_create.values()))
+        return partners
+
     def _make_request(self, url, payload=None, headers=None, method=None):
         account_peppol_edi_access_token = self.company_id.account_peppol_edi_access_token or self.env.user.company_id.account_peppol_edi_access_token
         headers['Authorization'] = f'Bearer {account_peppol_edi_access_token}'